@@ -1,6 +1,8 @@
 import asyncio
 import os
+import sys
 
+from collections.abc import Callable
 from contextlib import suppress
 from openai import AsyncOpenAI
 from pydantic import BaseModel
@@ -80,5 +82,21 @@ async def main():
             print(resp.output_text)
 
 
+def _loop_factory() -> Callable[[], asyncio.AbstractEventLoop] | None:
+    """Returns the event loop factory for asyncio.run.
+
+    Uses asyncio.SelectorEventLoop on Windows and uvloop elsewhere if the
+    optional extra is installed, otherwise the default event loop.
+    """
+    if sys.platform == "win32":
+        # Paho's socket callbacks need add_reader, which the proactor lacks
+        return asyncio.SelectorEventLoop
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=_loop_factory())
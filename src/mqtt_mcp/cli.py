@@ -1,6 +1,9 @@
 import asyncio
+import sys
 import typer
 
+from collections.abc import Callable
+
 from mqtt_mcp.server import MQTTMCP
 
 
@@ -10,6 +13,22 @@ app = typer.Typer(
 )
 
 
+def _loop_factory() -> Callable[[], asyncio.AbstractEventLoop] | None:
+    """Returns the event loop factory for asyncio.run.
+
+    Uses asyncio.SelectorEventLoop on Windows and uvloop elsewhere if the
+    optional extra is installed, otherwise the default event loop.
+    """
+    if sys.platform == "win32":
+        # Paho's socket callbacks need add_reader, which the proactor lacks
+        return asyncio.SelectorEventLoop
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
+
 @app.command()
 def run(
     host: str | None = typer.Option(None, "--host"),
@@ -21,4 +40,6 @@ def run(
     if port is not None:
         kwargs["port"] = port
     server = MQTTMCP()
-    asyncio.run(server.run_async(transport="http", **kwargs))
+    asyncio.run(
+        server.run_async(transport="http", **kwargs), loop_factory=_loop_factory()
+    )
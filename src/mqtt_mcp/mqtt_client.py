@@ -1,22 +1,35 @@
 """Async MQTT Client."""
 
 import asyncio
+import ipaddress
 import socket
 
 import paho.mqtt.client as mqtt
 
+from collections import deque
+from collections.abc import Callable
+from functools import partial
+from paho.mqtt.matcher import MQTTMatcher
 from typing import Optional
 
 
+_TCP_FAMILIES = (socket.AF_INET, socket.AF_INET6)
+
+
 def _resolve_host(host: str) -> str:
     """Resolve a hostname to an IP address.
 
     Uses the synchronous system resolver (socket.getaddrinfo), which respects
     mDNS (.local) names via the OS resolver stack (e.g. mDNSResponder on macOS).
-    Paho-mqtt's background thread does not reliably access the mDNS stack.
-    Returns the original host string if resolution fails so paho can surface
-    its own connection error.
+    IP addresses, such as the default 127.0.0.1, are returned without a
+    resolver call. Returns the original host string if resolution fails so
+    paho can surface its own connection error.
     """
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
     try:
         results = socket.getaddrinfo(host, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
         if results:
@@ -27,16 +40,72 @@ def _resolve_host(host: str) -> str:
 
 
 class AsyncioHelper:
-    """Integrate paho-mqtt socket callbacks with asyncio event loop."""
+    """Integrate paho-mqtt socket callbacks with asyncio event loop.
 
-    def __init__(self, client):
-        self.client = client
-
-    def start_loop(self):
-        self.client.loop_start()
+    Paho's network I/O runs on the event loop via add_reader/add_writer, so
+    no background thread is used. This requires a selector-based event loop,
+    which on Windows means asyncio.SelectorEventLoop rather than the default
+    proactor loop. Only the blocking TCP connect runs in a worker thread;
+    socket callbacks made from it are handed over to the loop.
+    """
 
-    def stop_loop(self):
-        self.client.loop_stop()
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: mqtt.Client):
+        self.loop = loop
+        self.client = client
+        self.misc: Optional[asyncio.Task] = None
+        self.client.on_socket_open = self.on_socket_open
+        self.client.on_socket_close = self.on_socket_close
+        self.client.on_socket_register_write = self.on_socket_register_write
+        self.client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def _call(self, callback: Callable[..., object], *args) -> None:
+        # The pool may drop clients after their loop has been closed, and
+        # closing them still sends DISCONNECT
+        if self.loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            callback(*args)
+        else:
+            # Called from the connect thread
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def on_socket_open(self, client, userdata, sock):
+        if isinstance(sock, socket.socket) and sock.family in _TCP_FAMILIES:
+            # Send small packets immediately instead of waiting on Nagle
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._call(self._open, sock.fileno())
+
+    def _open(self, fd: int) -> None:
+        self.loop.add_reader(fd, self.client.loop_read)
+        self.misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        # Take the descriptor now, paho closes the socket after this returns
+        self._call(self._close, sock.fileno())
+
+    def _close(self, fd: int) -> None:
+        self.loop.remove_reader(fd)
+        if self.misc is not None:
+            self.misc.cancel()
+            self.misc = None
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self._call(self.loop.add_writer, sock.fileno(), client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self._call(self.loop.remove_writer, sock.fileno())
+
+    async def misc_loop(self):
+        # loop_misc only sends PINGREQ and checks for PINGRESP timeouts, so a
+        # quarter of the keepalive keeps pings well inside the broker's 1.5x
+        # grace period without waking up every second.
+        interval = max(self.client.keepalive / 4, 1)
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(interval)
 
 
 class AsyncMQTTClient:
@@ -56,144 +125,335 @@ class AsyncMQTTClient:
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, clean_session=True)
         if self.username and self.password:
             self.client.username_pw_set(self.username, self.password)
-        self.future: Optional[asyncio.Future[str]] = None
+        # Receivers waiting for the next message, keyed by topic filter
+        self._waiters = MQTTMatcher()
+        # Filters with active receivers, mapped to their QoS
+        self._filters: dict[str, int] = {}
+        # Topics already subscribed on this session, mapped to their QoS
+        self._subs: dict[str, int] = {}
+        # Pending publishes keyed by message id
+        self._pubs: dict[int, asyncio.Future[None]] = {}
+        # Pending SUBACKs keyed by packet id
+        self._subacks: dict[int, asyncio.Future[list]] = {}
+        # CONNACK for the connection attempt in progress
+        self._connection_future: Optional[asyncio.Future[bool]] = None
 
     async def __aenter__(self) -> "AsyncMQTTClient":
         loop = asyncio.get_running_loop()
-        self.helper = AsyncioHelper(self.client)
-
-        # Set up connection callback
-        connection_future = loop.create_future()
+        self.helper = AsyncioHelper(loop, self.client)
 
+        # Set up connection callbacks; they run on the loop, so the future
+        # can be resolved directly
         def on_connect(client, userdata, flags, reason_code, properties):
+            future = self._connection_future
             if reason_code == 0:
-                loop.call_soon_threadsafe(connection_future.set_result, True)
-            else:
-                loop.call_soon_threadsafe(
-                    connection_future.set_exception,
-                    RuntimeError(f"MQTT connection failed with code {reason_code}"),
+                # A clean session starts without subscriptions
+                self._subs.clear()
+                if future is not None and not future.done():
+                    future.set_result(True)
+            elif future is not None and not future.done():
+                future.set_exception(
+                    RuntimeError(f"MQTT connection failed with code {reason_code}")
                 )
 
         def on_disconnect(client, userdata, reason_code, properties=None, *args):
             # Handle both v1 and v2 callback signatures (v2 passes properties as 4th arg)
             # Additional args are ignored for compatibility
+            future = self._connection_future
             if reason_code != 0:
                 # Unexpected disconnection
-                if not connection_future.done():
-                    loop.call_soon_threadsafe(
-                        connection_future.set_exception,
-                        RuntimeError(f"MQTT disconnected with code {reason_code}"),
+                if future is not None and not future.done():
+                    future.set_exception(
+                        RuntimeError(f"MQTT disconnected with code {reason_code}")
                     )
 
+        # Acknowledgements can arrive while closing a client whose loop is
+        # already closed; nobody is waiting on them then
+        def on_subscribe(client, userdata, mid, reason_codes, properties=None):
+            if not loop.is_closed():
+                loop.call_soon(self._on_suback, mid, reason_codes)
+
+        def on_publish(client, userdata, mid, reason_code=None, properties=None):
+            if not loop.is_closed():
+                loop.call_soon(self._on_publish, mid)
+
+        def on_message(client, userdata, message):
+            self._deliver(message.topic, message.payload)
+
         self.client.on_connect = on_connect
         self.client.on_disconnect = on_disconnect
+        self.client.on_subscribe = on_subscribe
+        self.client.on_publish = on_publish
+        self.client.on_message = on_message
 
-        # Resolve the hostname in the calling thread before connecting.
-        # Paho-mqtt's background network thread may not have access to the
-        # system mDNS resolver (e.g. .local names via mDNSResponder on macOS),
-        # but synchronous socket.getaddrinfo() in this thread does.
-        resolved_host = _resolve_host(self.host)
+        # Resolve the hostname with the system resolver before connecting,
+        # which respects mDNS (.local) names via the OS resolver stack
+        # (e.g. mDNSResponder on macOS).
+        resolved_host = await asyncio.to_thread(_resolve_host, self.host)
 
-        # Connect to the broker before starting the loop. This ensures that
-        # paho's host is set before the background thread starts and attempts
-        # reconnect(), avoiding a ValueError: Invalid host. race condition.
-        self.client.connect(resolved_host, self.port, keepalive=60)
+        # Opening the socket registers it with the event loop via the helper
+        await self._connect(
+            partial(self.client.connect, resolved_host, self.port, keepalive=60)
+        )
+        return self
 
-        # Start the client loop (Windows-compatible)
-        self.helper.start_loop()
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self) -> None:
+        """Send DISCONNECT and close the socket without waiting on the loop."""
+        if self.client.disconnect() == mqtt.MQTT_ERR_SUCCESS:
+            # Flush DISCONNECT now; paho closes the socket once it is written
+            self.client.loop_write()
+
+    async def reconnect(self) -> None:
+        """Reconnect a dropped session, reusing the paho client and callbacks.
+
+        Unacknowledged QoS 1 and 2 publishes are resent by paho under their
+        original message ids, so pending publishes complete once the broker
+        acknowledges them. Filters that still have receivers are subscribed
+        again, since the new clean session starts without subscriptions.
+        """
+        # SUBACKs for the old connection never arrive; the filters they
+        # covered are re-subscribed below if anyone is still receiving
+        for future in self._subacks.values():
+            if not future.done():
+                future.set_result([])
+        self._subacks.clear()
+        await self._connect(self.client.reconnect)
+        await self.subscribe_many(list(self._filters.items()))
+
+    async def _connect(self, connect: Callable[[], object]) -> None:
+        self._connection_future = asyncio.get_running_loop().create_future()
+        # paho opens the TCP connection with blocking calls, bounded by its
+        # own 5 second connect timeout, so keep them off the event loop
+        connecting = asyncio.ensure_future(asyncio.to_thread(connect))
 
         # Wait for connection to be established (timeout after 5 seconds)
         try:
-            await asyncio.wait_for(connection_future, timeout=5.0)
-        except asyncio.TimeoutError:
-            self.helper.stop_loop()
+            await asyncio.shield(connecting)
+            async with asyncio.timeout(5.0):
+                await self._connection_future
+        except TimeoutError:
+            self.close()
             raise RuntimeError(
                 f"Failed to connect to MQTT broker at {self.host}:{self.port} (timeout)"
             )
+        except asyncio.CancelledError:
+            # The connect thread cannot be interrupted; wait for it so the
+            # socket it may have opened is closed before giving up
+            await asyncio.wait([connecting])
+            if not connecting.cancelled():
+                connecting.exception()
+            self.close()
+            raise
+        finally:
+            self._connection_future = None
+
+    def _on_publish(self, mid: int) -> None:
+        future = self._pubs.pop(mid, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def _on_suback(self, mid: int, reason_codes: list) -> None:
+        future = self._subacks.pop(mid, None)
+        if future is not None and not future.done():
+            future.set_result(reason_codes)
+
+    async def subscribe_many(self, topics: list[tuple[str, int]]) -> None:
+        """Subscribe to several topics with a single SUBSCRIBE packet.
+
+        Topics already subscribed at the same or a higher QoS are skipped, so
+        receivers joining a filter that is already being received do not wait
+        for the broker. Filters are unsubscribed when their last receiver
+        leaves.
+        """
+        pending = [
+            (topic, qos) for topic, qos in topics if self._subs.get(topic, -1) < qos
+        ]
+        if not pending:
+            return
 
-        return self
-
-    async def __aexit__(self, exc_type, exc, tb):
-        self.helper.stop_loop()
-        self.client.disconnect()
-        await asyncio.sleep(0.1)  # Give time for disconnect to complete
-
-    async def receive(self, topic: str, timeout: int = 60, qos: int = 1) -> str:
         loop = asyncio.get_running_loop()
-        self.future = loop.create_future()
-
-        # Store original message callback if it exists
-        original_on_message = getattr(self.client, "on_message", None)
-
-        # Set up message callback that filters by topic
-        def on_message(client, userdata, message):
-            # Check if this message matches our topic
-            if message.topic == topic and self.future and not self.future.done():
-                try:
-                    message_str = message.payload.decode()
-                    loop.call_soon_threadsafe(self.future.set_result, message_str)
-                except Exception as e:
-                    if not self.future.done():
-                        loop.call_soon_threadsafe(self.future.set_exception, e)
-            # Call original callback if it exists (for chaining)
-            elif original_on_message:
-                original_on_message(client, userdata, message)
-
-        # Set up subscription callback to know when subscription is confirmed
-        subscription_future = loop.create_future()
-        original_on_subscribe = getattr(self.client, "on_subscribe", None)
-
-        def on_subscribe(client, userdata, mid, granted_qos, properties=None, *args):
-            # Subscription confirmed
-            if not subscription_future.done():
-                loop.call_soon_threadsafe(subscription_future.set_result, True)
-            # Call original callback if it exists
-            if original_on_subscribe:
-                original_on_subscribe(client, userdata, mid, granted_qos, properties)
-
-        # Register callbacks
-        self.client.on_subscribe = on_subscribe
-        self.client.on_message = on_message
-
-        # Subscribe to the topic
-        result, mid = self.client.subscribe(topic, qos=qos)
-        if result != mqtt.MQTT_ERR_SUCCESS:
-            # Restore original callbacks on error
-            if original_on_message:
-                self.client.on_message = original_on_message
-            if original_on_subscribe:
-                self.client.on_subscribe = original_on_subscribe
+        result, mid = self.client.subscribe(pending)
+        if result != mqtt.MQTT_ERR_SUCCESS or mid is None:
             raise RuntimeError(f"Subscribe failed with code {result}")
+        # SUBACK is dispatched onto the loop, so it cannot arrive before this
+        subscription_future = loop.create_future()
+        self._subacks[mid] = subscription_future
 
         # Wait for subscription to be acknowledged (with timeout)
         try:
-            await asyncio.wait_for(subscription_future, timeout=2.0)
-        except asyncio.TimeoutError:
+            async with asyncio.timeout(2.0):
+                reason_codes = await subscription_future
+        except TimeoutError:
             # Subscription might still work even if ack is slow
-            pass
+            self._subacks.pop(mid, None)
+            return
+
+        for (topic, qos), reason_code in zip(pending, reason_codes):
+            if not reason_code.is_failure:
+                self._subs[topic] = qos
+
+    def _deliver(self, topic: str, payload: bytes) -> None:
+        # Wake the oldest receiver on every filter that matches the topic
+        for waiters in self._waiters.iter_match(topic):
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    future.set_result(payload)
+                    break
+
+    async def receive(self, topic: str, timeout: int = 60, qos: int = 1) -> bytes:
+        """Wait for the next message on a topic and return its raw payload."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[bytes] = loop.create_future()
 
-        # Give a small delay to ensure subscription is active
-        await asyncio.sleep(0.2)
+        try:
+            waiters = self._waiters[topic]
+        except KeyError:
+            waiters = self._waiters[topic] = deque()
+        waiters.append(future)
+        self._filters[topic] = max(self._filters.get(topic, 0), qos)
 
         try:
-            return await asyncio.wait_for(self.future, timeout)
+            await self.subscribe_many([(topic, qos)])
+            async with asyncio.timeout(timeout):
+                return await future
         finally:
-            # Restore original callbacks
-            if original_on_message:
-                self.client.on_message = original_on_message
-            elif hasattr(self.client, "on_message"):
-                # If no original, just remove our callback
-                self.client.on_message = None
-            if original_on_subscribe:
-                self.client.on_subscribe = original_on_subscribe
-            self.future = None
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._remove_waiters(topic, waiters)
+
+    def _remove_waiters(self, topic: str, waiters: deque) -> None:
+        # Several receivers can empty the same deque; only the first one to
+        # resume removes it, and never a newer deque registered since
+        try:
+            if self._waiters[topic] is not waiters:
+                return
+        except KeyError:
+            return
+        del self._waiters[topic]
+        self._filters.pop(topic, None)
+        # Unsubscribe once nobody is receiving, so the next receive gets the
+        # retained message again and the connection stops getting the filter
+        self._subs.pop(topic, None)
+        if self.client.is_connected():
+            self.client.unsubscribe(topic)
 
     async def publish(self, topic: str, message: str, qos: int = 1) -> None:
         result = self.client.publish(topic, message, qos=qos)
         if result.rc != mqtt.MQTT_ERR_SUCCESS:
             raise RuntimeError(f"Publish failed with code {result.rc}")
-        # Wait for the publish to complete (especially for qos > 0)
-        if qos > 0:
-            result.wait_for_publish(timeout=5.0)
-        # Give the event loop a chance to process the publish
-        await asyncio.sleep(0.1)
+        # QoS 0 has no acknowledgement; the message is queued for writing
+        if qos == 0:
+            return
+        # on_publish is dispatched onto the loop, so it cannot arrive before this
+        publish_future = asyncio.get_running_loop().create_future()
+        self._pubs[result.mid] = publish_future
+
+        # Wait for the publish to complete (PUBACK/PUBCOMP)
+        try:
+            async with asyncio.timeout(5.0):
+                await publish_future
+        except TimeoutError:
+            self._pubs.pop(result.mid, None)
+            raise RuntimeError(f"Publish to {topic} was not acknowledged (timeout)")
+
+
+class AsyncMQTTClientPool:
+    """Pool of connected clients keyed by broker address and credentials.
+
+    Connects and reconnects run per key, so a slow broker only delays callers
+    of that broker. Clients that fail to reconnect are dropped, and once the
+    pool holds more than max_size clients the least recently used idle ones
+    are closed.
+    """
+
+    def __init__(self, max_size: int = 16) -> None:
+        self.max_size = max_size
+        # Connected clients, least recently used first
+        self._clients: dict[tuple, AsyncMQTTClient] = {}
+        # Connects and reconnects in progress, keyed like the clients
+        self._pending: dict[tuple, asyncio.Task[AsyncMQTTClient]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def get(
+        self,
+        host: str,
+        port: int = 1883,
+        username: str | None = None,
+        password: str | None = None,
+    ) -> AsyncMQTTClient:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Clients deliver results to the loop they were connected on, so
+            # anything pooled under a different loop cannot be reused.
+            stale = list(self._clients.values())
+            self._clients.clear()
+            self._pending.clear()
+            self._loop = loop
+            for client in stale:
+                client.close()
+
+        key = (host, port, username, password)
+        pooled = self._clients.get(key)
+        if pooled is not None and pooled.client.is_connected():
+            self._clients[key] = self._clients.pop(key)
+            return pooled
+
+        # Callers of the same broker share one connect; shield it so a caller
+        # giving up does not cancel it for the others
+        task = self._pending.get(key)
+        if task is None or task.done():
+            task = self._pending[key] = loop.create_task(self._open(key))
+            task.add_done_callback(partial(self._on_open_done, key))
+        return await asyncio.shield(task)
+
+    def _on_open_done(self, key: tuple, task: asyncio.Task) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+
+    async def _open(self, key: tuple) -> AsyncMQTTClient:
+        pooled = self._clients.pop(key, None)
+        if pooled is not None:
+            try:
+                await pooled.reconnect()
+            except BaseException:
+                pooled.close()
+                raise
+            self._clients[key] = pooled
+            return pooled
+
+        client = AsyncMQTTClient(*key)
+        await client.__aenter__()
+        self._clients[key] = client
+        self._evict()
+        return client
+
+    def _evict(self) -> None:
+        # Close the least recently used clients nobody is receiving or
+        # publishing on; busy clients stay even if the pool is over size, and
+        # the client just added is last so it is never the one closed
+        excess = len(self._clients) - self.max_size
+        for key, client in list(self._clients.items())[:-1]:
+            if excess <= 0:
+                break
+            if not client._filters and not client._pubs:
+                del self._clients[key]
+                client.close()
+                excess -= 1
+
+    async def close(self) -> None:
+        # Stop connects and reconnects first so none adds a client afterwards;
+        # a reconnecting client is only closed by its own task
+        pending = list(self._pending.values())
+        self._pending.clear()
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.__aexit__(None, None, None)
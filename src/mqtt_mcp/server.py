@@ -1,16 +1,29 @@
+import asyncio
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Literal
+
 from fastmcp import FastMCP
 from fastmcp.prompts.prompt import Message
 from fastmcp.resources import ResourceTemplate
+from pydantic import BaseModel
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 
-from mqtt_mcp.mqtt_client import AsyncMQTTClient
-from mqtt_mcp.settings import Settings
+from mqtt_mcp.mqtt_client import AsyncMQTTClient, AsyncMQTTClientPool
+from mqtt_mcp.settings import get_settings
+
+
+class MQTTMessage(BaseModel):
+    topic: str
+    message: str
+    qos: Literal[0, 1, 2] = 1
 
 
 class MQTTMCP(FastMCP):
     def __init__(self, **kwargs):
-        self.settings = Settings()
+        self.settings = get_settings()
+        self.clients = AsyncMQTTClientPool()
 
         auth = None
         if self.settings.auth.domain and self.settings.auth.url:
@@ -24,6 +37,7 @@ class MQTTMCP(FastMCP):
         super().__init__(
             name="MQTT MCP Server",
             auth=auth,
+            lifespan=self.mqtt_lifespan,
             **kwargs,
         )
 
@@ -51,11 +65,44 @@ class MQTTMCP(FastMCP):
             },
         )
 
+        self.tool(
+            self.publish_messages,
+            annotations={
+                "title": "Publish Messages",
+                "readOnlyHint": False,
+                "openWorldHint": True,
+            },
+        )
+
         self.prompt(self.mqtt_error, name="mqtt_error", tags={"mqtt", "error"})
         self.prompt(self.mqtt_help, name="mqtt_help", tags={"mqtt", "help"})
 
         self.custom_route("/health", methods=["GET"])(self.health_check)
 
+    @asynccontextmanager
+    async def mqtt_lifespan(self, server: FastMCP) -> AsyncIterator[dict]:
+        """Closes pooled broker connections on shutdown."""
+        try:
+            yield {}
+        finally:
+            await self.clients.close()
+
+    async def get_client(
+        self,
+        host: str | None = None,
+        port: int | None = None,
+        username: str | None = None,
+        password: str | None = None,
+    ) -> AsyncMQTTClient:
+        """Returns a pooled, connected client for the given broker."""
+        mqtt = self.settings.mqtt
+        return await self.clients.get(
+            host if host is not None else mqtt.host,
+            port if port is not None else mqtt.port,
+            username if username is not None else mqtt.username,
+            password if password is not None else mqtt.password,
+        )
+
     async def receive_message(
         self,
         topic: str,
@@ -67,13 +114,9 @@ class MQTTMCP(FastMCP):
     ) -> str:
         """Receives a message published to the specified topic, if any."""
         try:
-            async with AsyncMQTTClient(
-                host if host is not None else self.settings.mqtt.host,
-                port if port is not None else self.settings.mqtt.port,
-                username if username is not None else self.settings.mqtt.username,
-                password if password is not None else self.settings.mqtt.password,
-            ) as client:
-                return await client.receive(topic, timeout)
+            client = await self.get_client(host, port, username, password)
+            payload = await client.receive(topic, timeout)
+            return payload.decode()
         except Exception as e:
             raise RuntimeError(f"{e}") from e
 
@@ -88,14 +131,30 @@ class MQTTMCP(FastMCP):
     ) -> str:
         """Publishes a message to the specified topic."""
         try:
-            async with AsyncMQTTClient(
-                host if host is not None else self.settings.mqtt.host,
-                port if port is not None else self.settings.mqtt.port,
-                username if username is not None else self.settings.mqtt.username,
-                password if password is not None else self.settings.mqtt.password,
-            ) as client:
-                await client.publish(topic, message)
-            return f"Publish to {topic} on {host}:{port} has succedeed"
+            client = await self.get_client(host, port, username, password)
+            await client.publish(topic, message)
+            return f"Publish to {topic} on {client.host}:{client.port} has succedeed"
+        except Exception as e:
+            raise RuntimeError(f"{e}") from e
+
+    async def publish_messages(
+        self,
+        messages: list[MQTTMessage],
+        host: str | None = None,
+        port: int | None = None,
+        username: str | None = None,
+        password: str | None = None,
+    ) -> str:
+        """Publishes multiple messages over a single connection."""
+        try:
+            client = await self.get_client(host, port, username, password)
+            await asyncio.gather(
+                *(client.publish(m.topic, m.message, m.qos) for m in messages)
+            )
+            return (
+                f"Publish of {len(messages)} messages on "
+                f"{client.host}:{client.port} has succedeed"
+            )
         except Exception as e:
             raise RuntimeError(f"{e}") from e
 
@@ -1,10 +1,12 @@
-from pydantic import BaseModel
+from functools import lru_cache
+from pydantic import BaseModel, ConfigDict
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Auth(BaseModel):
     domain: str | None = None
     url: str | None = None
+    model_config = ConfigDict(frozen=True)
 
 
 class MQTT(BaseModel):
@@ -12,6 +14,7 @@ class MQTT(BaseModel):
     port: int = 1883
     username: str | None = None
     password: str | None = None
+    model_config = ConfigDict(frozen=True)
 
 
 class Settings(BaseSettings):
@@ -23,3 +26,9 @@ class Settings(BaseSettings):
         env_nested_delimiter="__",
         env_prefix="MQTT_MCP_",
     )
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Returns settings parsed once from the environment and .env file."""
+    return Settings()
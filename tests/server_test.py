@@ -1,9 +1,12 @@
 import asyncio
 import pytest
+import socket
 
+from contextlib import suppress
+from fastmcp.exceptions import ToolError
 from starlette.requests import Request
 
-from mqtt_mcp.mqtt_client import _resolve_host
+from mqtt_mcp.mqtt_client import AsyncMQTTClientPool, _resolve_host
 
 
 @pytest.mark.asyncio
@@ -60,6 +63,318 @@ async def test_publish_message(server, mcp, client):
     assert "succedeed" in result.content[0].text
 
 
+@pytest.mark.asyncio
+async def test_publish_messages(server, mcp, client):
+    """Test publish_messages."""
+    pooled = await mcp.get_client(server.host, server.port)
+    receive = asyncio.create_task(pooled.receive("foo/batch", timeout=5))
+    await asyncio.sleep(0.1)
+    result = await client.call_tool(
+        "publish_messages",
+        {
+            "messages": [
+                {"topic": "foo", "message": '{"bar":1}'},
+                {"topic": "foo", "message": '{"bar":2}', "qos": 0},
+                {"topic": "foo/batch", "message": '{"bar":3}', "qos": 2},
+            ],
+            "host": server.host,
+            "port": server.port,
+        },
+    )
+    assert len(result.content) == 1
+    assert "3 messages" in result.content[0].text
+    assert await receive == b'{"bar":3}'
+    with pytest.raises(ToolError):
+        await client.call_tool(
+            "publish_messages",
+            {
+                "messages": [{"topic": "foo", "message": "bar", "qos": 3}],
+                "host": server.host,
+                "port": server.port,
+            },
+        )
+
+
+@pytest.mark.asyncio
+async def test_client_pool(server, mcp):
+    """get_client should reuse one connection per broker."""
+    first = await mcp.get_client(server.host, server.port)
+    second = await mcp.get_client(server.host, server.port)
+    assert first is second
+    assert first.client.is_connected()
+    sock = first.client.socket()
+    assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+    await mcp.clients.close()
+    assert not first.client.is_connected()
+
+
+@pytest.mark.asyncio
+async def test_client_pool_reconnect(server, mcp):
+    """get_client should reconnect a dropped client in place."""
+    first = await mcp.get_client(server.host, server.port)
+    paho_client = first.client
+    first.close()
+    assert not first.client.is_connected()
+    second = await mcp.get_client(server.host, server.port)
+    assert second is first
+    assert second.client is paho_client
+    assert second.client.is_connected()
+    await second.publish("foo", "bar")
+    await mcp.clients.close()
+
+
+@pytest.mark.asyncio
+async def test_client_pool_reconnect_receive(server, mcp):
+    """Receivers waiting across a reconnect should still get messages."""
+    pooled = await mcp.get_client(server.host, server.port)
+    task = asyncio.create_task(pooled.receive("foo/reconnect", timeout=5))
+    await asyncio.sleep(0.2)
+    pooled.close()
+    assert await mcp.get_client(server.host, server.port) is pooled
+    assert pooled._subs == {"foo/reconnect": 1}
+    await pooled.publish("foo/reconnect", "back")
+    assert await task == b"back"
+    await mcp.clients.close()
+
+
+def test_client_pool_loop_change(server):
+    """A pool reused across event loops should close clients of closed loops."""
+    pool = AsyncMQTTClientPool()
+
+    async def publish():
+        client = await pool.get(server.host, server.port)
+        await client.publish("foo", "bar")
+        return client
+
+    first = asyncio.run(publish())
+    second = asyncio.run(publish())
+    assert second is not first
+    assert first.client.socket() is None
+    asyncio.run(pool.close())
+    assert second.client.socket() is None
+
+
+@pytest.mark.asyncio
+async def test_client_pool_slow_broker(server):
+    """A broker that never answers should not stall other brokers."""
+
+    async def handle(reader, writer):
+        await reader.read()
+        writer.close()
+
+    silent = await asyncio.start_server(handle, "127.0.0.1", 0)
+    silent_port = silent.sockets[0].getsockname()[1]
+    pool = AsyncMQTTClientPool()
+    slow = asyncio.create_task(pool.get("127.0.0.1", silent_port))
+    await asyncio.sleep(0.1)
+    async with asyncio.timeout(1.0):
+        client = await pool.get(server.host, server.port)
+    assert client.client.is_connected()
+    assert not slow.done()
+    # Closing the pool should stop the connect instead of pooling it later
+    await pool.close()
+    with pytest.raises(asyncio.CancelledError):
+        await slow
+    assert not client.client.is_connected()
+    assert not pool._clients and not pool._pending
+    silent.close()
+    await silent.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_client_pool_hanging_handshake(server):
+    """A broker whose TCP handshake hangs should not block the event loop."""
+    listener = socket.create_server(("127.0.0.1", 0), backlog=0)
+    port = listener.getsockname()[1]
+    # Fill the accept backlog so further handshakes are left unanswered
+    backlog = []
+    for _ in range(4):
+        sock = socket.socket()
+        sock.setblocking(False)
+        sock.connect_ex(("127.0.0.1", port))
+        backlog.append(sock)
+    pool = AsyncMQTTClientPool()
+    slow = asyncio.create_task(pool.get("127.0.0.1", port))
+    await asyncio.sleep(0.1)
+    async with asyncio.timeout(1.0):
+        client = await pool.get(server.host, server.port)
+    assert client.client.is_connected()
+    assert not slow.done()
+    # Refuse the retried handshake so the slow connect fails quickly
+    listener.close()
+    with pytest.raises(ConnectionRefusedError):
+        await slow
+    for sock in backlog:
+        sock.close()
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_client_pool_evict(server):
+    """The pool should close least recently used idle clients over max_size."""
+    pool = AsyncMQTTClientPool(max_size=2)
+    first = await pool.get(server.host, server.port)
+    receive = asyncio.create_task(first.receive("foo/evict", timeout=5))
+    await asyncio.sleep(0.1)
+    second = await pool.get("localhost", server.port)
+    third = await pool.get(server.host, server.port, "user", "pass")
+    assert first.client.is_connected()
+    assert not second.client.is_connected()
+    assert list(pool._clients.values()) == [first, third]
+    receive.cancel()
+    await asyncio.sleep(0)
+    fourth = await pool.get("localhost", server.port, "user", "pass")
+    assert not first.client.is_connected()
+    assert list(pool._clients.values()) == [third, fourth]
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_client_pool_reconnect_failed(server):
+    """Clients that fail to reconnect should be dropped from the pool."""
+    streams = []
+
+    async def pipe(reader, writer):
+        with suppress(OSError):
+            while data := await reader.read(4096):
+                writer.write(data)
+        writer.close()
+
+    async def handle(reader, writer):
+        # Forward to the broker so the listener can be stopped later
+        upstream = await asyncio.open_connection(server.host, server.port)
+        streams.extend([writer, upstream[1]])
+        await asyncio.gather(pipe(reader, upstream[1]), pipe(upstream[0], writer))
+
+    listener = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    pool = AsyncMQTTClientPool()
+    first = await pool.get("127.0.0.1", port)
+    listener.close()
+    for writer in streams:
+        writer.close()
+    await listener.wait_closed()
+    async with asyncio.timeout(1.0):
+        while first.client.is_connected():
+            await asyncio.sleep(0.01)
+    with pytest.raises(ConnectionRefusedError):
+        await pool.get("127.0.0.1", port)
+    assert not pool._clients
+    assert first.client.socket() is None
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_many(server, mcp):
+    """subscribe_many should remember topics acknowledged by the broker."""
+    client = await mcp.get_client(server.host, server.port)
+    await client.subscribe_many([("foo/a", 1), ("foo/b", 0)])
+    assert client._subs == {"foo/a": 1, "foo/b": 0}
+    await client.subscribe_many([("foo/a", 0), ("foo/b", 1)])
+    assert client._subs == {"foo/a": 1, "foo/b": 1}
+    await mcp.clients.close()
+
+
+@pytest.mark.asyncio
+async def test_receive_retained(server, mcp, client):
+    """Each receive should get the retained message and then unsubscribe."""
+    pooled = await mcp.get_client(server.host, server.port)
+    pooled.client.publish("foo/status", "online", qos=1, retain=True)
+    await asyncio.sleep(0.2)
+
+    for _ in range(2):
+        result = await client.call_tool(
+            "receive_message",
+            {
+                "topic": "foo/status",
+                "host": server.host,
+                "port": server.port,
+                "timeout": 3,
+            },
+        )
+        assert result.content[0].text == "online"
+    assert "foo/status" not in pooled._subs
+
+    # The connection no longer receives the filter
+    delivered = []
+    pooled._deliver = lambda topic, payload: delivered.append(topic)
+    await pooled.publish("foo/status", "offline")
+    await asyncio.sleep(0.2)
+    del pooled._deliver
+    assert not delivered
+
+    # Clear the retained message
+    pooled.client.publish("foo/status", b"", qos=1, retain=True)
+    await asyncio.sleep(0.2)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_receive(server, mcp):
+    """Concurrent receives on one connection should each get their own topic."""
+    client = await mcp.get_client(server.host, server.port)
+    await client.subscribe_many([("foo/a", 1), ("foo/b", 1)])
+
+    async with asyncio.TaskGroup() as tg:
+        a = tg.create_task(client.receive("foo/a", timeout=3))
+        b = tg.create_task(client.receive("foo/b", timeout=3))
+        await asyncio.sleep(0.1)
+        await client.publish("foo/b", "b")
+        await client.publish("foo/a", "a")
+
+    assert a.result() == b"a"
+    assert b.result() == b"b"
+    assert not list(client._waiters.iter_match("foo/a"))
+    assert client.client.on_message is not None
+    await mcp.clients.close()
+
+
+@pytest.mark.asyncio
+async def test_receive_same_topic(server, mcp):
+    """Receivers on one topic should each get a message delivered together."""
+    client = await mcp.get_client(server.host, server.port)
+    first = asyncio.create_task(client.receive("foo/same", timeout=3))
+    second = asyncio.create_task(client.receive("foo/same", timeout=3))
+    await asyncio.sleep(0.1)
+
+    # Both futures resolve before either receiver resumes
+    client._deliver("foo/same", b"1")
+    client._deliver("foo/same", b"2")
+    third = asyncio.create_task(client.receive("foo/same", timeout=3))
+
+    assert await first == b"1"
+    assert await second == b"2"
+    await asyncio.sleep(0.1)
+    client._deliver("foo/same", b"3")
+    assert await third == b"3"
+    await mcp.clients.close()
+
+
+@pytest.mark.asyncio
+async def test_receive_wildcard(server, mcp):
+    """receive should match topic filters with wildcards."""
+    client = await mcp.get_client(server.host, server.port)
+    await client.subscribe_many([("sensors/+/temp", 1), ("sensors/#", 1)])
+
+    async with asyncio.TaskGroup() as tg:
+        single = tg.create_task(client.receive("sensors/+/temp", timeout=3))
+        multi = tg.create_task(client.receive("sensors/#", timeout=3))
+        await asyncio.sleep(0.1)
+        await client.publish("sensors/foo/temp", "21")
+
+    assert single.result() == b"21"
+    assert multi.result() == b"21"
+    await mcp.clients.close()
+
+
+@pytest.mark.asyncio
+async def test_publish_qos0(server, mcp):
+    """QoS 0 publishes should not wait for an acknowledgement."""
+    client = await mcp.get_client(server.host, server.port)
+    await client.publish("foo", "bar", qos=0)
+    assert not client._pubs
+    await mcp.clients.close()
+
+
 @pytest.mark.asyncio
 async def test_help_prompt(mcp, client):
     """Test help prompt."""
@@ -102,6 +417,12 @@ def test_resolve_host_ip_passthrough():
     assert result == "127.0.0.1"
 
 
+def test_resolve_host_ipv6_passthrough():
+    """_resolve_host should return an IPv6 address unchanged."""
+    result = _resolve_host("::1")
+    assert result == "::1"
+
+
 def test_resolve_host_unresolvable():
     """_resolve_host should return the original string when resolution fails."""
     result = _resolve_host("this.host.does.not.exist.invalid")
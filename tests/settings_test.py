@@ -0,0 +1,7 @@
+from mqtt_mcp.settings import get_settings
+
+
+def test_get_settings(mcp):
+    """get_settings should parse settings once and share them."""
+    assert get_settings() is get_settings()
+    assert mcp.settings is get_settings()